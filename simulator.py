@@ -1,4 +1,5 @@
 import pygame
+import numpy as np
 import json
 import sys
 import os
@@ -29,14 +30,13 @@ class WaveformVisualizer:
             print(f"Number of frequency bands: {num_bands}")
             # Print average amplitude for each band across first 100 frames
             if len(self.frequency_data) >= 100:
-                band_averages = [0] * num_bands
-                for frame in self.frequency_data[:100]:
-                    for i, amp in enumerate(frame):
-                        band_averages[i] += amp
-                band_averages = [avg/100 for avg in band_averages]
-                print("Average amplitude per band (first 100 frames):")
-                for i, avg in enumerate(band_averages):
-                    print(f"Band {i}: {avg:.3f}")
+                band_averages = np.mean(self.frequency_data[:100], axis=0)
+                print("Average amplitude per band (first 100 frames):\n" +
+                      "\n".join(f"Band {i}: {avg:.3f}" for i, avg in enumerate(band_averages)))
+        
+        # Convert all frames to screen coordinates once, so drawing a frame only
+        # has to read the precomputed rectangles
+        self.layout_frames()
         
         # Color settings
         self.red = 255
@@ -51,43 +51,45 @@ class WaveformVisualizer:
         self.audio_path = audio_path
         pygame.mixer.music.load(audio_path)
     
-    def draw_frame(self, bands):
-        """Draw a single frame of the visualization."""
-        # Clear screen
-        self.screen.fill((0, 0, 0))
+    def layout_frames(self):
+        """Precompute the band rectangles of every frame in screen pixels."""
+        frames = np.array(self.frequency_data, dtype=np.float64, ndmin=2)
+        num_bands = frames.shape[1]
         
         # Calculate width of each band to fill screen
-        band_width = width / len(bands)
+        band_width = width / max(1, num_bands)
         
         # Add offset to shift visualization to the right
         x_offset = 0  # No offset, centered visualization
         
-        # Draw frequency bands
-        for i, amplitude in enumerate(bands):
-            # Normalize amplitude to 0-1 range (assuming max amplitude of 15.0)
-            normalized_amplitude = amplitude / 15.0
-            # Then scale to appropriate display height (using most of our 32px height)
-            amplitude = normalized_amplitude * 14  # This will give us max height of 14px from center
-            
-            # Calculate x position and width for this band, adding the offset
-            x = (i * band_width) + x_offset
-            
-            # Calculate wave points
-            mid_point = height // 2
-            
-            # Mirror the wave to get the classic soundwave effect
-            start_y = int(mid_point - amplitude)
-            end_y = int(mid_point + amplitude)
-            
-            # Keep within bounds with minimal margins
-            start_y = max(0, start_y)
-            end_y = min(height - 1, end_y)
-            
-            # Draw filled rectangle for this frequency band
-            rect_height = end_y - start_y + 1
-            rect_width = max(1, int(band_width * scale))  # Ensure minimum width of 1 pixel
-            pygame.draw.rect(self.screen, (self.red, self.green, self.blue),
-                           (int(x * scale), start_y * scale, rect_width, rect_height * scale))
+        # Calculate x position and width of every band, adding the offset
+        self.band_x = ((np.arange(num_bands) * band_width + x_offset) * scale).astype(int).tolist()
+        self.rect_width = max(1, int(band_width * scale))  # Ensure minimum width of 1 pixel
+        
+        # Normalize amplitudes to 0-1 range (assuming max amplitude of 15.0), then
+        # scale to display height (max height of 14px from center)
+        amplitudes = frames / 15.0 * 14
+        
+        # Mirror the wave around the middle to get the classic soundwave effect,
+        # keeping within bounds with minimal margins
+        mid_point = height // 2
+        start_y = np.maximum(0, (mid_point - amplitudes).astype(int))
+        end_y = np.minimum(height - 1, (mid_point + amplitudes).astype(int))
+        
+        # Screen coordinates fit in int16, which keeps all frames packed together
+        self.rect_y = (start_y * scale).astype(np.int16)
+        self.rect_heights = ((end_y - start_y + 1) * scale).astype(np.int16)
+    
+    def draw_frame(self, frame):
+        """Draw a single frame of the visualization."""
+        # Clear screen
+        self.screen.fill((0, 0, 0))
+        
+        # Draw filled rectangle for each frequency band
+        color = (self.red, self.green, self.blue)
+        for x, y, rect_height in zip(self.band_x, self.rect_y[frame].tolist(),
+                                     self.rect_heights[frame].tolist()):
+            self.screen.fill(color, (x, y, self.rect_width, rect_height))
         
         # Update the display
         pygame.display.flip()
@@ -116,9 +118,8 @@ class WaveformVisualizer:
                             pygame.mixer.music.unpause()
             
             if not paused:
-                # Get current frame of frequency data
-                bands = self.frequency_data[self.frame]
-                self.draw_frame(bands)
+                # Draw current frame of frequency data
+                self.draw_frame(self.frame)
                 self.frame += 1
             
             # Maintain frame rate